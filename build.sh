@@ -16,6 +16,8 @@ pyinstaller --onefile \
     --hidden-import=composio \
     --hidden-import=openai \
     --hidden-import=flask \
+    --hidden-import=orjson \
+    --hidden-import=waitress \
     --collect-all composio \
     --collect-all openai \
     main.py
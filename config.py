@@ -4,11 +4,14 @@ Handles credential storage and retrieval for .exe deployment
 """
 
 import os
-import json
+import time
 import uuid
+from functools import cached_property
 from pathlib import Path
 from typing import Optional
 
+import orjson
+
 # Get the directory where the script/exe is located
 def get_app_dir() -> Path:
     """Get the application directory for storing config files."""
@@ -32,139 +35,253 @@ CONFIG_FILE = APP_DIR / "credentials.json"
 AUTH_CONFIG_FILE = APP_DIR / "auth_config.json"
 USER_ID_FILE = APP_DIR / "user_id.json"
 
+# Minimum seconds between mtime checks of a cached config file
+STAT_INTERVAL = 1.0
+
+
+def _read_json(path: Path) -> dict:
+    """Read a JSON file, returning an empty dict if it is missing or invalid."""
+    try:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    except (ValueError, OSError):
+        return {}
+
+
+def _dump_json(data: dict) -> bytes:
+    """Serialize data in the on-disk format."""
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+
+def _write_json(path: Path, payload: bytes) -> None:
+    """Atomically replace a file so a crash never leaves it half-written."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
 
 class Config:
     """Configuration manager for the Email Agent."""
     
+    # Parsed files shared by all instances: path -> (checked_at, mtime_ns, data)
+    _cache: dict = {}
+    # Hash of the serialized content last read from or written to each path
+    _disk_hashes: dict = {}
+    # Bumped whenever cached file data is reloaded or modified
+    _generation = 0
+    
     def __init__(self):
-        self._config = self._load_config()
-        self._auth_config = self._load_auth_config()
-        self._user_id_data = self._load_user_id()
+        # Files are read lazily on first access; see _cached()
+        # Setters only mark data dirty; writes happen in flush()
+        self._dirty_config = False
+        self._dirty_auth = False
+        self._dirty_user_id = False
+        self._batch_depth = 0
+        # Derived values as (generation, value), recomputed after any change
+        self._to_dict_cache = None
+        self._check_cache = None
+        # Environment fallbacks, read once instead of on every property access
+        self._env = {
+            'COMPOSIO_API_KEY': os.getenv('COMPOSIO_API_KEY'),
+            'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY'),
+            'AZURE_OPENAI_ENDPOINT': os.getenv('AZURE_OPENAI_ENDPOINT'),
+            'OPENAI_API_VERSION': os.getenv('OPENAI_API_VERSION', '2024-12-01-preview'),
+            'AZURE_OPENAI_DEPLOYMENT': os.getenv('AZURE_OPENAI_DEPLOYMENT', 'gpt-4o'),
+            'GMAIL_CLIENT_ID': os.getenv('GMAIL_CLIENT_ID'),
+            'GMAIL_CLIENT_SECRET': os.getenv('GMAIL_CLIENT_SECRET'),
+        }
+    
+    def __enter__(self) -> "Config":
+        """Defer setter writes until the outermost block exits."""
+        self._batch_depth += 1
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self._batch_depth -= 1
+        if not self._batch_depth:
+            self.flush()
+    
+    def flush(self) -> None:
+        """Write modified configuration files to disk."""
+        if self._dirty_config:
+            self._save_config()
+            self._dirty_config = False
+        if self._dirty_auth:
+            self._save_auth_config()
+            self._dirty_auth = False
+        if self._dirty_user_id:
+            self._save_user_id()
+            self._dirty_user_id = False
+    
+    def _autoflush(self) -> None:
+        """Record a change and flush immediately unless inside a batch."""
+        Config._generation += 1
+        if not self._batch_depth:
+            self.flush()
+    
+    def _cached(self, path: Path, loader, dirty: bool) -> dict:
+        """Return the parsed file, re-reading it only after its mtime changes."""
+        cached = self._cache.get(path)
+        now = time.monotonic()
+        if cached is not None and (dirty or now - cached[0] < STAT_INTERVAL):
+            return cached[2]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if cached is not None and cached[1] == mtime:
+            self._cache[path] = (now, mtime, cached[2])
+            return cached[2]
+        data = loader()
+        Config._generation += 1
+        self._cache[path] = (now, mtime, data)
+        self._disk_hashes[path] = hash(_dump_json(data))
+        return data
+    
+    def _store(self, path: Path, data: dict) -> None:
+        """Write a file unless unchanged, recording its new mtime so it isn't re-read."""
+        payload = _dump_json(data)
+        digest = hash(payload)
+        if self._disk_hashes.get(path) == digest:
+            return
+        _write_json(path, payload)
+        self._disk_hashes[path] = digest
+        self._cache[path] = (time.monotonic(), os.stat(path).st_mtime_ns, data)
+    
+    def _current_generation(self) -> int:
+        """Revalidate the cached files and return the data generation."""
+        # Property access reloads any file whose mtime changed
+        self._config
+        self._auth_config
+        self._user_id_data
+        return Config._generation
+    
+    @property
+    def _config(self) -> dict:
+        """Credentials from credentials.json."""
+        return self._cached(CONFIG_FILE, self._load_config, self._dirty_config)
+    
+    @property
+    def _auth_config(self) -> dict:
+        """Authentication state from auth_config.json."""
+        return self._cached(AUTH_CONFIG_FILE, self._load_auth_config, self._dirty_auth)
+    
+    @property
+    def _user_id_data(self) -> dict:
+        """User ID data from user_id.json."""
+        return self._cached(USER_ID_FILE, self._load_user_id, self._dirty_user_id)
     
     def _load_config(self) -> dict:
         """Load configuration from file."""
-        if CONFIG_FILE.exists():
-            try:
-                with open(CONFIG_FILE, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                return {}
-        return {}
+        return _read_json(CONFIG_FILE)
     
     def _save_config(self) -> None:
         """Save configuration to file."""
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(self._config, f, indent=2)
+        self._store(CONFIG_FILE, self._config)
     
     def _load_auth_config(self) -> dict:
         """Load authentication configuration."""
-        if AUTH_CONFIG_FILE.exists():
-            try:
-                with open(AUTH_CONFIG_FILE, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                return {}
-        return {}
+        return _read_json(AUTH_CONFIG_FILE)
     
     def _save_auth_config(self) -> None:
         """Save authentication configuration."""
-        with open(AUTH_CONFIG_FILE, 'w') as f:
-            json.dump(self._auth_config, f, indent=2)
+        self._store(AUTH_CONFIG_FILE, self._auth_config)
     
     def _load_user_id(self) -> dict:
         """Load user ID from file."""
-        if USER_ID_FILE.exists():
-            try:
-                with open(USER_ID_FILE, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                return {}
-        return {}
+        return _read_json(USER_ID_FILE)
     
     def _save_user_id(self) -> None:
         """Save user ID to file."""
-        with open(USER_ID_FILE, 'w') as f:
-            json.dump(self._user_id_data, f, indent=2)
+        self._store(USER_ID_FILE, self._user_id_data)
     
     # Composio API Key
     @property
     def composio_api_key(self) -> Optional[str]:
         """Get Composio API key."""
-        return self._config.get('composio_api_key') or os.getenv('COMPOSIO_API_KEY')
+        return self._config.get('composio_api_key') or self._env['COMPOSIO_API_KEY']
     
     @composio_api_key.setter
     def composio_api_key(self, value: str) -> None:
         """Set Composio API key."""
         self._config['composio_api_key'] = value
-        self._save_config()
+        self._dirty_config = True
+        self._autoflush()
     
     # Azure OpenAI Configuration
     @property
     def openai_api_key(self) -> Optional[str]:
         """Get Azure OpenAI API key."""
-        return self._config.get('openai_api_key') or os.getenv('OPENAI_API_KEY')
+        return self._config.get('openai_api_key') or self._env['OPENAI_API_KEY']
     
     @openai_api_key.setter
     def openai_api_key(self, value: str) -> None:
         """Set Azure OpenAI API key."""
         self._config['openai_api_key'] = value
-        self._save_config()
+        self._dirty_config = True
+        self._autoflush()
     
     @property
     def azure_openai_endpoint(self) -> Optional[str]:
         """Get Azure OpenAI endpoint."""
-        return self._config.get('azure_openai_endpoint') or os.getenv('AZURE_OPENAI_ENDPOINT')
+        return self._config.get('azure_openai_endpoint') or self._env['AZURE_OPENAI_ENDPOINT']
     
     @azure_openai_endpoint.setter
     def azure_openai_endpoint(self, value: str) -> None:
         """Set Azure OpenAI endpoint."""
         self._config['azure_openai_endpoint'] = value
-        self._save_config()
+        self._dirty_config = True
+        self._autoflush()
     
     @property
     def openai_api_version(self) -> str:
         """Get Azure OpenAI API version."""
-        return self._config.get('openai_api_version') or os.getenv('OPENAI_API_VERSION', '2024-12-01-preview')
+        return self._config.get('openai_api_version') or self._env['OPENAI_API_VERSION']
     
     @openai_api_version.setter
     def openai_api_version(self, value: str) -> None:
         """Set Azure OpenAI API version."""
         self._config['openai_api_version'] = value
-        self._save_config()
+        self._dirty_config = True
+        self._autoflush()
     
     @property
     def azure_openai_deployment(self) -> str:
         """Get Azure OpenAI deployment name."""
-        return self._config.get('azure_openai_deployment') or os.getenv('AZURE_OPENAI_DEPLOYMENT', 'gpt-4o')
+        return self._config.get('azure_openai_deployment') or self._env['AZURE_OPENAI_DEPLOYMENT']
     
     @azure_openai_deployment.setter
     def azure_openai_deployment(self, value: str) -> None:
         """Set Azure OpenAI deployment name."""
         self._config['azure_openai_deployment'] = value
-        self._save_config()
+        self._dirty_config = True
+        self._autoflush()
     
     # Gmail OAuth Credentials
     @property
     def gmail_client_id(self) -> Optional[str]:
         """Get Gmail OAuth client ID."""
-        return self._config.get('gmail_client_id') or os.getenv('GMAIL_CLIENT_ID')
+        return self._config.get('gmail_client_id') or self._env['GMAIL_CLIENT_ID']
     
     @gmail_client_id.setter
     def gmail_client_id(self, value: str) -> None:
         """Set Gmail OAuth client ID."""
         self._config['gmail_client_id'] = value
-        self._save_config()
+        self._dirty_config = True
+        self._autoflush()
     
     @property
     def gmail_client_secret(self) -> Optional[str]:
         """Get Gmail OAuth client secret."""
-        return self._config.get('gmail_client_secret') or os.getenv('GMAIL_CLIENT_SECRET')
+        return self._config.get('gmail_client_secret') or self._env['GMAIL_CLIENT_SECRET']
     
     @gmail_client_secret.setter
     def gmail_client_secret(self, value: str) -> None:
         """Set Gmail OAuth client secret."""
         self._config['gmail_client_secret'] = value
-        self._save_config()
+        self._dirty_config = True
+        self._autoflush()
     
     # User and Connection IDs
     @property
@@ -174,7 +291,8 @@ class Config:
             # Generate a unique user ID
             unique_id = str(uuid.uuid4())
             self._user_id_data['user_id'] = unique_id
-            self._save_user_id()
+            self._dirty_user_id = True
+            self._autoflush()
             return unique_id
         return self._user_id_data['user_id']
     
@@ -182,7 +300,8 @@ class Config:
     def user_id(self, value: str) -> None:
         """Set user ID."""
         self._user_id_data['user_id'] = value
-        self._save_user_id()
+        self._dirty_user_id = True
+        self._autoflush()
     
     @property
     def connection_id(self) -> Optional[str]:
@@ -193,7 +312,8 @@ class Config:
     def connection_id(self, value: str) -> None:
         """Set Gmail connection ID."""
         self._auth_config['connection_id'] = value
-        self._save_auth_config()
+        self._dirty_auth = True
+        self._autoflush()
     
     @property
     def gmail_auth_config_id(self) -> Optional[str]:
@@ -204,31 +324,58 @@ class Config:
     def gmail_auth_config_id(self, value: str) -> None:
         """Set Gmail auth config ID."""
         self._auth_config['gmail_auth_config_id'] = value
-        self._save_auth_config()
+        self._dirty_auth = True
+        self._autoflush()
     
-    # Flask Configuration
-    @property
+    # Flask Configuration (read once; the server binds at startup)
+    @cached_property
     def flask_host(self) -> str:
         """Get Flask host."""
         return self._config.get('flask_host', '0.0.0.0')
     
-    @property
+    @cached_property
     def flask_port(self) -> int:
         """Get Flask port."""
         return self._config.get('flask_port', 5001)
     
-    @property
+    @cached_property
     def flask_debug(self) -> bool:
         """Get Flask debug mode."""
         return self._config.get('flask_debug', False)
     
+    @cached_property
+    def server_threads(self) -> int:
+        """Get the number of request threads for the production server."""
+        return self._config.get('server_threads', 8)
+    
+    @cached_property
+    def server_connection_limit(self) -> int:
+        """Get the maximum number of open connections for the production server."""
+        return self._config.get('server_connection_limit', 100)
+    
+    @cached_property
+    def prewarm(self) -> bool:
+        """Get whether to warm the tool schemas and OpenAI connection at startup."""
+        return self._config.get('prewarm', True)
+    
+    def _check_configured(self) -> tuple[bool, tuple[str, ...]]:
+        """Check required credentials once, returning (configured, missing)."""
+        generation = self._current_generation()
+        if self._check_cache is not None and self._check_cache[0] == generation:
+            return self._check_cache[1]
+        required = (
+            ('composio_api_key', self.composio_api_key),
+            ('openai_api_key', self.openai_api_key),
+            ('azure_openai_endpoint', self.azure_openai_endpoint),
+        )
+        missing = tuple(name for name, value in required if not value)
+        result = (not missing, missing)
+        self._check_cache = (generation, result)
+        return result
+    
     def is_configured(self) -> bool:
         """Check if required credentials are configured."""
-        return all([
-            self.composio_api_key,
-            self.openai_api_key,
-            self.azure_openai_endpoint,
-        ])
+        return self._check_configured()[0]
     
     def is_authenticated(self) -> bool:
         """Check if Gmail is authenticated."""
@@ -236,14 +383,7 @@ class Config:
     
     def get_missing_credentials(self) -> list:
         """Get list of missing credentials."""
-        missing = []
-        if not self.composio_api_key:
-            missing.append('composio_api_key')
-        if not self.openai_api_key:
-            missing.append('openai_api_key')
-        if not self.azure_openai_endpoint:
-            missing.append('azure_openai_endpoint')
-        return missing
+        return list(self._check_configured()[1])
     
     def set_credentials(
         self,
@@ -256,32 +396,37 @@ class Config:
         gmail_client_secret: Optional[str] = None,
         user_id: Optional[str] = None,
     ) -> None:
-        """Set multiple credentials at once."""
-        if composio_api_key:
-            self.composio_api_key = composio_api_key
-        if openai_api_key:
-            self.openai_api_key = openai_api_key
-        if azure_openai_endpoint:
-            self.azure_openai_endpoint = azure_openai_endpoint
-        if openai_api_version:
-            self.openai_api_version = openai_api_version
-        if azure_openai_deployment:
-            self.azure_openai_deployment = azure_openai_deployment
-        if gmail_client_id:
-            self.gmail_client_id = gmail_client_id
-        if gmail_client_secret:
-            self.gmail_client_secret = gmail_client_secret
-        if user_id:
-            self.user_id = user_id
+        """Set multiple credentials at once, writing each file at most once."""
+        with self:
+            if composio_api_key:
+                self.composio_api_key = composio_api_key
+            if openai_api_key:
+                self.openai_api_key = openai_api_key
+            if azure_openai_endpoint:
+                self.azure_openai_endpoint = azure_openai_endpoint
+            if openai_api_version:
+                self.openai_api_version = openai_api_version
+            if azure_openai_deployment:
+                self.azure_openai_deployment = azure_openai_deployment
+            if gmail_client_id:
+                self.gmail_client_id = gmail_client_id
+            if gmail_client_secret:
+                self.gmail_client_secret = gmail_client_secret
+            if user_id:
+                self.user_id = user_id
     
     def clear_auth(self) -> None:
         """Clear authentication data."""
-        self._auth_config = {}
-        self._save_auth_config()
+        self._auth_config.clear()
+        self._dirty_auth = True
+        self._autoflush()
     
     def to_dict(self) -> dict:
         """Get all configuration as dictionary (sensitive data masked)."""
-        return {
+        generation = self._current_generation()
+        if self._to_dict_cache is not None and self._to_dict_cache[0] == generation:
+            return self._to_dict_cache[1]
+        data = {
             'composio_api_key': '***' if self.composio_api_key else None,
             'openai_api_key': '***' if self.openai_api_key else None,
             'azure_openai_endpoint': self.azure_openai_endpoint,
@@ -295,6 +440,9 @@ class Config:
             'is_configured': self.is_configured(),
             'is_authenticated': self.is_authenticated(),
         }
+        # Building the dict may itself generate a user ID, so read the generation afterwards
+        self._to_dict_cache = (Config._generation, data)
+        return data
 
 
 # Global config instance
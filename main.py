@@ -3,12 +3,22 @@ Email Agent - Flask server for Gmail actions using Composio
 OAuth2 authentication with credential storage for .exe deployment
 """
 
+import atexit
+import logging
+import logging.handlers
 import os
+import queue
+import re
 import sys
-import webbrowser
-from typing import Optional
-from flask import Flask, request, jsonify
-import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Iterator, Optional
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import JSONProvider
+import httpx
+import orjson
 
 from config import config
 
@@ -19,79 +29,289 @@ if config.openai_api_key:
     os.environ['OPENAI_API_KEY'] = config.openai_api_key
 
 from composio import Composio
+from composio_client import APIStatusError
 from openai import AzureOpenAI
+from openai.types.chat import ChatCompletionMessageToolCall
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for jsonify() and get_json()."""
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj).decode()
+    
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+    
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        # Pass orjson's bytes straight through rather than decoding and re-encoding
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Request-path diagnostics are queued and written by a listener thread, so
+# concurrent requests never contend for the console; print() is kept for
+# startup output and the interactive authentication prompt
+logger = logging.getLogger("email_agent")
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
 # Global clients
 composio_client: Optional[Composio] = None
 openai_client: Optional[AzureOpenAI] = None
 
+# Keep-alive connection pool shared by the Composio and Azure OpenAI clients, so
+# TCP and TLS setup is paid once per host rather than once per request
+_http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=50),
+    timeout=60.0,
+)
+atexit.register(_http_client.close)
+
+# Settings the current clients were built with, so unchanged clients are reused
+_last_composio_key: Optional[str] = None
+_last_openai_settings: Optional[tuple[str, str, str]] = None
+
+# Azure OpenAI request limits; the SDK default timeout is 10 minutes
+OPENAI_TIMEOUT = 30.0
+OPENAI_MAX_RETRIES = 2
+
+# Seconds a connected-account lookup stays valid; "not connected" expires sooner
+# so a completed authentication is noticed quickly
+CONNECTION_CACHE_TTL = 60
+CONNECTION_CACHE_NEGATIVE_TTL = 5
+
+# user_id -> (expires_at, connected)
+_conn_cache: dict[str, tuple[float, bool]] = {}
+
+# Essential Gmail tools only (reduced set to avoid large function definitions)
+_GMAIL_TOOLS: tuple[str, ...] = (
+    "GMAIL_FETCH_EMAILS",
+    "GMAIL_SEND_EMAIL",
+    "GMAIL_CREATE_EMAIL_DRAFT",
+    "GMAIL_LIST_LABELS",
+)
+
+# Tools with side effects; a failed call is reported rather than retried, since
+# Composio may already have run it before the error reached us
+_WRITE_TOOLS = frozenset({"GMAIL_SEND_EMAIL", "GMAIL_CREATE_EMAIL_DRAFT"})
+
+# Composio statuses that can mean the Gmail connection was revoked or removed
+_AUTH_ERROR_STATUSES = frozenset({401, 403, 404})
+
+# Replies for turns made up only of successful write actions, as (one, many);
+# for a single-action prompt the outcome needs no commentary, so the follow-up
+# model call is skipped
+_WRITE_ACTION_REPLIES: dict[str, tuple[str, str]] = {
+    "GMAIL_SEND_EMAIL": ("Email sent.", "{n} emails sent."),
+    "GMAIL_CREATE_EMAIL_DRAFT": ("Draft created.", "{n} drafts created."),
+}
+
+# A prompt is treated as a single action only when it is one clause with exactly
+# one of the write verbs and no read verb or continuation word, any of which
+# may introduce further steps
+_ACTION_VERBS = frozenset({"send", "draft", "compose", "write", "reply", "forward"})
+_READ_VERBS = frozenset({
+    "show", "list", "fetch", "find", "read", "search",
+    "summarize", "summarise", "label", "check", "get",
+})
+_CONTINUATION_WORDS = frozenset({"and", "then", "also", "after", "afterwards", "before", "next", "plus"})
+_WORD_PATTERN = re.compile(r"[a-z]+")
+# Punctuation ends a clause only before whitespace, so addresses like a@b.com stay whole
+_CLAUSE_BREAK_PATTERN = re.compile(r"[.,;:!?](?=\s)|\n")
+
+# Tool results beyond this many bytes of JSON are truncated before reaching the model
+MAX_TOOL_RESULT_BYTES = 15000
+
+# Every turn resends the whole history, so once tool output in it exceeds this
+# many characters, results from earlier turns are cut down to the smaller size
+HISTORY_TOOL_OUTPUT_BUDGET = 20000
+COMPACTED_TOOL_RESULT_CHARS = 2000
+
+_TRUNCATION_NOTE = "\n\n... [truncated due to length]"
+
+SYSTEM_PROMPT = """You are a helpful Gmail assistant. Help users manage emails concisely.
+When fetching emails, request only a small number (max 5) unless user asks for more.
+After actions, give a brief summary. Keep responses short and clear."""
+
+# Shared by every conversation; the OpenAI SDK only reads message dicts
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Seconds fetched tool schemas are reused before being fetched again
+TOOLS_CACHE_TTL = 600
+
+# user_id -> (fetched_at, tool schemas fetched from Composio)
+_TOOLS_CACHE: dict[str, tuple[float, Any]] = {}
+_tools_lock = threading.Lock()
+
+# Auth configs seen on Composio, indexed by ID and by upper-cased toolkit slug.
+# The full list is fetched at most once per Composio client.
+_auth_configs_by_id: dict[str, Any] = {}
+_auth_configs_by_toolkit: dict[str, Any] = {}
+_auth_configs_listed = False
+
+# Seconds to wait for the user to finish the OAuth flow
+AUTH_TIMEOUT = 120
+
+# Connection request being completed in the background, so repeated
+# /authenticate calls share one flow instead of each pinning a waiting thread
+_pending_auth: Optional[Any] = None
+_pending_auth_lock = threading.Lock()
+
+# Runs independent Composio calls (setup lookups, a turn's tool calls) concurrently
+_tool_executor = ThreadPoolExecutor(thread_name_prefix="gmail-tool")
+
+# Cap on tool executions in flight across all requests, so a prompt that fans
+# out into many tool calls can't trip Composio's rate limits
+MAX_CONCURRENT_TOOL_CALLS = 8
+_tool_call_slots = threading.BoundedSemaphore(MAX_CONCURRENT_TOOL_CALLS)
+
 
 def initialize_clients():
     """Initialize Composio and Azure OpenAI clients."""
-    global composio_client, openai_client
+    global composio_client, openai_client, _auth_configs_listed
+    global _last_composio_key, _last_openai_settings
     
     if not config.is_configured():
         missing = config.get_missing_credentials()
         raise ValueError(f"Missing credentials: {', '.join(missing)}")
     
-    composio_client = Composio(api_key=config.composio_api_key)
-    openai_client = AzureOpenAI(
-        api_key=config.openai_api_key,
-        api_version=config.openai_api_version,
-        azure_endpoint=config.azure_openai_endpoint,
+    # Rebuilding a client discards its connection pool, so only do it on change
+    if composio_client is None or config.composio_api_key != _last_composio_key:
+        composio_client = Composio(api_key=config.composio_api_key, http_client=_http_client)
+        _last_composio_key = config.composio_api_key
+        _TOOLS_CACHE.clear()
+        _auth_configs_by_id.clear()
+        _auth_configs_by_toolkit.clear()
+        _auth_configs_listed = False
+    
+    openai_settings = (
+        config.openai_api_key,
+        config.openai_api_version,
+        config.azure_openai_endpoint,
     )
+    if openai_client is None or openai_settings != _last_openai_settings:
+        openai_client = AzureOpenAI(
+            api_key=config.openai_api_key,
+            api_version=config.openai_api_version,
+            azure_endpoint=config.azure_openai_endpoint,
+            max_retries=OPENAI_MAX_RETRIES,
+            timeout=OPENAI_TIMEOUT,
+            http_client=_http_client,
+        )
+        _last_openai_settings = openai_settings
+
+
+def invalidate_connection_cache() -> None:
+    """Forget cached connected-account lookups."""
+    _conn_cache.clear()
 
 
 def check_connected_account_exists() -> bool:
     """Check if an active Gmail connection exists for the user."""
-    if not composio_client:
+    if composio_client is None:
         return False
     
+    user_id = config.user_id
+    cached = _conn_cache.get(user_id)
+    if cached is not None and time.monotonic() < cached[0]:
+        return cached[1]
+    
     try:
-        connected_accounts = composio_client.connected_accounts.list(
-            user_ids=[config.user_id],
-            toolkit_slugs=["GMAIL"],
-        )
-        
-        for account in connected_accounts.items:
-            if account.status == "ACTIVE":
-                config.connection_id = account.id
-                return True
-            else:
-                print(f"[warning] Inactive account {account.id} found for user: {config.user_id}")
-        
-        return False
+        connected = _lookup_connected_account(user_id)
     except Exception as e:
-        print(f"Error checking connected accounts: {e}")
+        logger.error("Error checking connected accounts: %s", e)
         return False
+    
+    ttl = CONNECTION_CACHE_TTL if connected else CONNECTION_CACHE_NEGATIVE_TTL
+    _conn_cache[user_id] = (time.monotonic() + ttl, connected)
+    return connected
+
+
+def _lookup_connected_account(user_id: str) -> bool:
+    """Ask Composio whether the user has an active Gmail connection."""
+    # A stored connection can be verified directly instead of listing accounts
+    if config.connection_id:
+        try:
+            account = composio_client.connected_accounts.get(config.connection_id)
+            if account.status == "ACTIVE" and account.user_id == user_id:
+                return True
+        except Exception:
+            pass
+    
+    connected_accounts = composio_client.connected_accounts.list(
+        user_ids=[user_id],
+        toolkit_slugs=["GMAIL"],
+    )
+    
+    for account in connected_accounts.items:
+        if account.status == "ACTIVE":
+            config.connection_id = account.id
+            return True
+        else:
+            logger.warning("Inactive account %s found for user: %s", account.id, user_id)
+    
+    return False
+
+
+def _toolkit_key(auth_config) -> Optional[str]:
+    """Normalize an auth config's toolkit, which may be a slug or a toolkit object."""
+    toolkit = getattr(auth_config, 'toolkit', None)
+    slug = getattr(toolkit, 'slug', toolkit)
+    return slug.upper() if isinstance(slug, str) else None
+
+
+def _index_auth_configs() -> None:
+    """List auth configs once and index them by ID and toolkit."""
+    global _auth_configs_listed
+    
+    if _auth_configs_listed:
+        return
+    for auth_config in composio_client.auth_configs.list().items:
+        _auth_configs_by_id[auth_config.id] = auth_config
+        toolkit = _toolkit_key(auth_config)
+        if toolkit:
+            _auth_configs_by_toolkit.setdefault(toolkit, auth_config)
+    _auth_configs_listed = True
 
 
 def get_or_create_auth_config():
     """Get existing Gmail auth config or create a new one using Composio managed auth."""
-    if not composio_client:
+    if composio_client is None:
         raise ValueError("Composio client not initialized")
     
-    # Check for existing auth config
-    if config.gmail_auth_config_id:
+    auth_config_id = config.gmail_auth_config_id
+    if auth_config_id in _auth_configs_by_id:
+        return _auth_configs_by_id[auth_config_id]
+    
+    # Fetch the stored auth config directly by ID
+    if auth_config_id:
         try:
-            auth_configs = composio_client.auth_configs.list()
-            for auth_config in auth_configs.items:
-                if auth_config.id == config.gmail_auth_config_id:
-                    return auth_config
+            auth_config = composio_client.auth_configs.get(auth_config_id)
+            _auth_configs_by_id[auth_config.id] = auth_config
+            return auth_config
         except Exception:
             pass
     
     # Look for existing Gmail auth config
     try:
-        auth_configs = composio_client.auth_configs.list()
-        for auth_config in auth_configs.items:
-            if hasattr(auth_config, 'toolkit') and auth_config.toolkit == "GMAIL":
-                config.gmail_auth_config_id = auth_config.id
-                return auth_config
+        _index_auth_configs()
     except Exception:
         pass
+    auth_config = _auth_configs_by_toolkit.get("GMAIL")
+    if auth_config is not None:
+        config.gmail_auth_config_id = auth_config.id
+        return auth_config
     
     # Create new auth config using Composio's managed authentication
     # No need for your own Gmail OAuth credentials!
@@ -103,12 +323,14 @@ def get_or_create_auth_config():
         },
     )
     config.gmail_auth_config_id = auth_config.id
+    _auth_configs_by_id[auth_config.id] = auth_config
+    _auth_configs_by_toolkit["GMAIL"] = auth_config
     return auth_config
 
 
-def authenticate_gmail():
-    """Initiate Gmail OAuth2 authentication flow."""
-    if not composio_client:
+def start_gmail_authentication():
+    """Initiate Gmail OAuth2 and return the pending connection request."""
+    if composio_client is None:
         raise ValueError("Composio client not initialized")
     
     auth_config = get_or_create_auth_config()
@@ -125,88 +347,229 @@ def authenticate_gmail():
     print(f"\n{connection_request.redirect_url}\n")
     print(f"{'='*60}\n")
     
-    # Try to open browser automatically
+    # Try to open browser automatically; launching it can block, so don't wait
+    threading.Thread(
+        target=_open_browser,
+        args=(connection_request.redirect_url,),
+        daemon=True,
+    ).start()
+    
+    return connection_request
+
+
+def _open_browser(url: str) -> None:
+    """Open a URL in the default browser, ignoring failures."""
+    # Imported here: only the authentication flow needs it
+    import webbrowser
+    
     try:
-        webbrowser.open(connection_request.redirect_url)
+        webbrowser.open(url)
     except Exception:
         pass
+
+
+def _wait_and_store(connection_request) -> str:
+    """Wait for the user to finish OAuth, then store the new connection."""
+    connection_request.wait_for_connection(timeout=AUTH_TIMEOUT)
+    config.connection_id = connection_request.id
+    invalidate_connection_cache()
+    _TOOLS_CACHE.clear()
+    return connection_request.id
+
+
+def _wait_and_store_in_background(connection_request) -> None:
+    """Complete a pending authentication off the request thread."""
+    global _pending_auth
     
-    # Wait for authentication
-    print("Waiting for authentication... (timeout: 120 seconds)")
-    connection_request.wait_for_connection(timeout=120)
+    try:
+        _wait_and_store(connection_request)
+        logger.info("Gmail authentication successful")
+    except Exception as e:
+        logger.error("Authentication failed: %s", e)
+    finally:
+        with _pending_auth_lock:
+            _pending_auth = None
+
+
+def authenticate_gmail():
+    """Run the Gmail OAuth2 authentication flow, blocking until it completes."""
+    connection_request = start_gmail_authentication()
+    
+    print(f"Waiting for authentication... (timeout: {AUTH_TIMEOUT} seconds)")
+    connection_id = _wait_and_store(connection_request)
     
-    config.connection_id = connection_request.id
     print("\n✓ Gmail authentication successful!")
-    return connection_request.id
+    return connection_id
 
 
-def truncate_result(result: str, max_chars: int = 15000) -> str:
-    """Truncate tool result to avoid token limits."""
-    if len(result) <= max_chars:
-        return result
-    return result[:max_chars] + "\n\n... [truncated due to length]"
+def truncate_result(result: Any, max_bytes: int = MAX_TOOL_RESULT_BYTES) -> str:
+    """Serialize a tool result as JSON, truncated to avoid token limits."""
+    if isinstance(result, str):
+        data = result.encode()
+    else:
+        data = orjson.dumps(result, default=str, option=orjson.OPT_NON_STR_KEYS)
+    if len(data) <= max_bytes:
+        return data.decode()
+    # Only the surviving prefix is decoded; a split multi-byte character is dropped
+    return data[:max_bytes].decode(errors='ignore') + _TRUNCATION_NOTE
+
+
+def _compact_history(messages: list, keep_from: int) -> None:
+    """Shrink tool results before index keep_from once the history grows too large."""
+    tool_messages = [m for m in messages if m["role"] == "tool"]
+    if sum(len(m["content"]) for m in tool_messages) <= HISTORY_TOOL_OUTPUT_BUDGET:
+        return
+    for message in messages[:keep_from]:
+        if message["role"] == "tool" and len(message["content"]) > COMPACTED_TOOL_RESULT_CHARS:
+            message["content"] = message["content"][:COMPACTED_TOOL_RESULT_CHARS] + _TRUNCATION_NOTE
+
+
+def get_cached_tools():
+    """Return the Gmail tool schemas, fetching them from Composio when stale."""
+    user_id = config.user_id
+    # Concurrent requests on a cold cache wait for one fetch instead of racing
+    with _tools_lock:
+        cached = _TOOLS_CACHE.get(user_id)
+        if cached is not None and time.monotonic() - cached[0] < TOOLS_CACHE_TTL:
+            return cached[1]
+        tools = composio_client.tools.get(user_id=user_id, tools=list(_GMAIL_TOOLS))
+        _TOOLS_CACHE[user_id] = (time.monotonic(), tools)
+        return tools
+
+
+def _execute_tool_call(tool_call, provider, user_id: str):
+    """Execute a tool call, revalidating the Gmail connection if Composio rejects it."""
+    with _tool_call_slots:
+        try:
+            return provider.execute_tool_call(user_id=user_id, tool_call=tool_call)
+        except APIStatusError as e:
+            if e.status_code not in _AUTH_ERROR_STATUSES:
+                raise
+            # The stored connection may have been revoked since it was last
+            # checked. A failed lookup propagates instead of counting as
+            # "not connected", so an outage never clears the stored session.
+            invalidate_connection_cache()
+            if not _lookup_connected_account(user_id):
+                config.clear_auth()
+                raise ValueError("Gmail not authenticated. Please authenticate first.") from e
+            if tool_call.function.name in _WRITE_TOOLS:
+                raise
+            return provider.execute_tool_call(user_id=user_id, tool_call=tool_call)
+
+
+def _stream_turn(client, deployment: str, messages: list, tools) -> Iterator[tuple[str, str]]:
+    """Stream one model turn, yielding text deltas and returning the assistant message."""
+    stream = client.chat.completions.create(
+        model=deployment,
+        tools=tools,
+        messages=messages,
+        stream=True,
+    )
+    
+    content = []
+    tool_calls: dict[int, dict] = {}
+    for chunk in stream:
+        # Azure sends content-filter chunks with no choices
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content.append(delta.content)
+            yield "delta", delta.content
+        # Tool calls arrive in fragments keyed by their index in the turn
+        for fragment in delta.tool_calls or ():
+            call = tool_calls.setdefault(fragment.index, {
+                "id": "",
+                "type": "function",
+                "function": {"name": "", "arguments": ""},
+            })
+            if fragment.id:
+                call["id"] = fragment.id
+            if fragment.function:
+                call["function"]["name"] += fragment.function.name or ""
+                call["function"]["arguments"] += fragment.function.arguments or ""
+    
+    message = {"role": "assistant", "content": "".join(content) or None}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+    return message
 
 
-def run_gmail_agent(prompt: str) -> str:
-    """Run the Gmail agent with a prompt and return a natural language response."""
-    if not all([composio_client, openai_client]):
+def stream_gmail_agent(prompt: str) -> Iterator[tuple[str, str]]:
+    """Start the Gmail agent and return its events.
+    
+    Events are ("delta", text) as model text streams in and ("turn", "") when a
+    turn ends in tool calls, so any text streamed so far was interim. The last
+    event is ("final", response), where response is exactly the deltas since
+    the last turn event. Setup errors are raised here, before any event.
+    """
+    if composio_client is None or openai_client is None:
         raise ValueError("Clients not initialized")
     
+    # A stored connection is trusted; a failing tool call triggers revalidation
+    if config.connection_id:
+        return _agent_events(prompt, get_cached_tools())
+    
+    # Otherwise check the connection while the tool schemas are fetched
+    tools_future = _tool_executor.submit(get_cached_tools)
     if not check_connected_account_exists():
+        tools_future.cancel()
         raise ValueError("Gmail not authenticated. Please authenticate first.")
-    
-    # Get essential Gmail tools only (reduced set to avoid large function definitions)
-    tools = composio_client.tools.get(
-        user_id=config.user_id,
-        tools=[
-            "GMAIL_FETCH_EMAILS",
-            "GMAIL_SEND_EMAIL",
-            "GMAIL_CREATE_EMAIL_DRAFT",
-            "GMAIL_LIST_LABELS",
-        ]
-    )
+    return _agent_events(prompt, tools_future.result())
+
+
+def _agent_events(prompt: str, tools) -> Iterator[tuple[str, str]]:
+    """Run the agentic loop, yielding stream_gmail_agent() events."""
+    # Resolve clients and settings once rather than on every turn and tool call
+    client = openai_client
+    deployment = config.azure_openai_deployment
+    execute = partial(_execute_tool_call, provider=composio_client.provider, user_id=config.user_id)
     
     # Build conversation messages
-    messages = [
-        {
-            "role": "system",
-            "content": """You are a helpful Gmail assistant. Help users manage emails concisely.
-When fetching emails, request only a small number (max 5) unless user asks for more.
-After actions, give a brief summary. Keep responses short and clear."""
-        },
-        {"role": "user", "content": prompt}
-    ]
+    messages = [_SYSTEM_MESSAGE, {"role": "user", "content": prompt}]
+    
+    # Only a single-action prompt can be finished by its tool results alone
+    single_action = _is_single_action_prompt(prompt)
     
     # Agentic loop - keep processing until we get a final response
     max_iterations = 5
     for _ in range(max_iterations):
-        # Generate response using Azure OpenAI
-        response = openai_client.chat.completions.create(
-            model=config.azure_openai_deployment,
-            tools=tools,
-            messages=messages,
-        )
-        
-        assistant_message = response.choices[0].message
+        # Generate response using Azure OpenAI, passing text through as it arrives
+        assistant_message = yield from _stream_turn(client, deployment, messages, tools)
         
         # If no tool calls, return the final response
-        if not assistant_message.tool_calls:
-            return assistant_message.content or "Done!"
+        if "tool_calls" not in assistant_message:
+            if assistant_message["content"]:
+                yield "final", assistant_message["content"]
+            else:
+                yield "delta", "Done!"
+                yield "final", "Done!"
+            return
+        
+        # Text streamed alongside tool calls was commentary, not the answer
+        yield "turn", ""
         
         # Add assistant message to conversation
+        turn_start = len(messages)
         messages.append(assistant_message)
         
-        # Execute each tool call and add results to conversation
-        for tool_call in assistant_message.tool_calls:
-            # Execute the tool using Composio
-            tool_result = composio_client.provider.execute_tool_call(
-                user_id=config.user_id,
-                tool_call=tool_call,
-            )
-            
+        # Execute the tool calls using Composio; they are independent, so run
+        # several at once. map() keeps results in tool_call order.
+        tool_calls = [
+            ChatCompletionMessageToolCall(**call) for call in assistant_message["tool_calls"]
+        ]
+        if len(tool_calls) == 1:
+            tool_results = [execute(tool_calls[0])]
+        else:
+            tool_results = list(_tool_executor.map(execute, tool_calls))
+        
+        # Add each tool result to the conversation
+        for tool_call, tool_result in zip(tool_calls, tool_results):
             # Truncate large results to avoid token limits
-            result_str = str(tool_result) if tool_result else "Action completed successfully."
-            result_str = truncate_result(result_str)
+            if tool_result:
+                result_str = truncate_result(tool_result)
+            else:
+                result_str = "Action completed successfully."
             
             # Add tool result to messages
             messages.append({
@@ -214,32 +577,83 @@ After actions, give a brief summary. Keep responses short and clear."""
                 "tool_call_id": tool_call.id,
                 "content": result_str
             })
+        
+        # A successful send or draft answers a single-action prompt; skip the wrap-up turn
+        reply = _write_action_reply(tool_calls, tool_results) if single_action else None
+        if reply is not None:
+            yield "delta", reply
+            yield "final", reply
+            return
+        
+        # Keep this turn's results intact; older ones have already been read
+        _compact_history(messages, turn_start)
+    
+    yield "delta", "I've completed the requested actions."
+    yield "final", "I've completed the requested actions."
+
+
+def _is_single_action_prompt(prompt: str) -> bool:
+    """Check whether a prompt asks for one action with no follow-up steps."""
+    clauses = [c for c in _CLAUSE_BREAK_PATTERN.split(prompt.strip().rstrip(".!?")) if c.strip()]
+    if len(clauses) != 1:
+        return False
+    words = _WORD_PATTERN.findall(prompt.lower())
+    if _CONTINUATION_WORDS.intersection(words) or _READ_VERBS.intersection(words):
+        return False
+    return sum(word in _ACTION_VERBS for word in words) == 1
+
+
+def _write_action_reply(tool_calls, tool_results) -> Optional[str]:
+    """Summarize a turn of successful send/draft calls, or None if the model should."""
+    counts: dict[str, int] = {}
+    for tool_call, tool_result in zip(tool_calls, tool_results):
+        name = tool_call.function.name
+        if name not in _WRITE_ACTION_REPLIES:
+            return None
+        if not (isinstance(tool_result, dict) and tool_result.get("successful")):
+            return None
+        counts[name] = counts.get(name, 0) + 1
     
-    return "I've completed the requested actions."
+    replies = []
+    for name, n in counts.items():
+        one, many = _WRITE_ACTION_REPLIES[name]
+        replies.append(one if n == 1 else many.format(n=n))
+    return " ".join(replies)
+
+
+def run_gmail_agent(prompt: str) -> str:
+    """Run the Gmail agent with a prompt and return a natural language response."""
+    events = stream_gmail_agent(prompt)
+    return next(text for kind, text in events if kind == "final")
 
 
 # ============================================================================
 # Flask Routes
 # ============================================================================
 
+# The API documentation never changes, so serialize it once at import
+_HOME_RESPONSE_BODY = orjson.dumps({
+    "name": "Email Agent API",
+    "version": "1.0.0",
+    "description": "Gmail actions powered by Composio",
+    "endpoints": {
+        "GET /": "API documentation",
+        "GET /status": "Check authentication status",
+        "POST /authenticate": "Initiate Gmail authentication",
+        "GET /authenticate/status": "Check pending Gmail authentication",
+        "POST /query": "Execute Gmail action with natural language prompt",
+    },
+    "example": {
+        "endpoint": "POST /query",
+        "body": {"query": "Show me my last 5 emails"},
+    }
+})
+
+
 @app.route('/')
 def home():
     """Home endpoint with API documentation."""
-    return jsonify({
-        "name": "Email Agent API",
-        "version": "1.0.0",
-        "description": "Gmail actions powered by Composio",
-        "endpoints": {
-            "GET /": "API documentation",
-            "GET /status": "Check authentication status",
-            "POST /authenticate": "Initiate Gmail authentication",
-            "POST /query": "Execute Gmail action with natural language prompt",
-        },
-        "example": {
-            "endpoint": "POST /query",
-            "body": {"query": "Show me my last 5 emails"},
-        }
-    })
+    return Response(_HOME_RESPONSE_BODY, mimetype='application/json')
 
 
 @app.route('/status')
@@ -256,6 +670,8 @@ def status():
 @app.route('/authenticate', methods=['POST'])
 def authenticate():
     """Initiate Gmail OAuth2 authentication."""
+    global _pending_auth
+    
     if not config.is_configured():
         return jsonify({
             "error": "Missing credentials",
@@ -273,28 +689,76 @@ def authenticate():
                 "connection_id": config.connection_id
             })
         
-        # Start authentication flow (this will block)
-        connection_id = authenticate_gmail()
+        # Start authentication flow and finish it in the background, reusing
+        # a flow that is already waiting for the user
+        with _pending_auth_lock:
+            if _pending_auth is None:
+                _pending_auth = start_gmail_authentication()
+                threading.Thread(
+                    target=_wait_and_store_in_background,
+                    args=(_pending_auth,),
+                    daemon=True,
+                ).start()
+            connection_request = _pending_auth
         
         return jsonify({
             "success": True,
-            "message": "Authentication successful",
-            "connection_id": connection_id
-        })
+            "message": "Authentication started. Visit redirect_url to continue.",
+            "redirect_url": connection_request.redirect_url,
+            "status_check_url": "/authenticate/status",
+        }), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/authenticate/status')
+def authenticate_status():
+    """Check whether a pending Gmail authentication has completed."""
+    return jsonify({
+        "authenticated": check_connected_account_exists(),
+        "pending": _pending_auth is not None,
+        "connection_id": config.connection_id,
+    })
+
+
+def _sse_events(events: Iterator[tuple[str, str]]) -> Iterator[str]:
+    """Format agent events as server-sent events."""
+    try:
+        for kind, text in events:
+            if kind == "delta":
+                yield f"event: delta\ndata: {orjson.dumps({'content': text}).decode()}\n\n"
+            elif kind == "turn":
+                yield "event: turn\ndata: {}\n\n"
+            else:
+                payload = orjson.dumps({"success": True, "response": text}).decode()
+                yield f"event: done\ndata: {payload}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {orjson.dumps({'error': str(e)}).decode()}\n\n"
+
+
 @app.route('/query', methods=['POST'])
 def query():
-    """Execute a Gmail action using natural language."""
-    data = request.get_json()
+    """Execute a Gmail action using natural language.
     
-    if not data or 'query' not in data:
+    With "stream": true the reply is sent as server-sent events while the
+    model generates it.
+    """
+    # silent=True turns malformed bodies into None instead of raising an HTML error
+    data = request.get_json(silent=True)
+    prompt = data.get('query') if isinstance(data, dict) else None
+    
+    if not prompt or not isinstance(prompt, str):
         return jsonify({"error": "Missing 'query' in request body"}), 400
     
+    if data.get('stream'):
+        try:
+            events = stream_gmail_agent(prompt)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        return Response(_sse_events(events), mimetype='text/event-stream')
+    
     try:
-        response = run_gmail_agent(data['query'])
+        response = run_gmail_agent(prompt)
         return jsonify({
             "success": True,
             "response": response
@@ -306,6 +770,29 @@ def query():
 # Main Entry Point
 # ============================================================================
 
+def prewarm_clients() -> None:
+    """Fetch the tool schemas and open the Azure OpenAI connection before the first query."""
+    if not config.prewarm:
+        return
+    
+    tools_future = _tool_executor.submit(get_cached_tools)
+    try:
+        # A one-token completion completes the TLS handshake on the shared pool
+        openai_client.chat.completions.create(
+            model=config.azure_openai_deployment,
+            messages=[{"role": "user", "content": "ping"}],
+            max_tokens=1
+        )
+        print("✓ Azure OpenAI connection warmed")
+    except Exception as e:
+        print(f"⚠ Could not warm Azure OpenAI connection: {e}")
+    try:
+        tools_future.result()
+        print("✓ Gmail tool schemas cached")
+    except Exception as e:
+        print(f"⚠ Could not prefetch Gmail tool schemas: {e}")
+
+
 def startup_check():
     """Perform startup checks for authentication and configuration."""
     print("\n" + "="*60)
@@ -351,11 +838,13 @@ def startup_check():
             print("✓ Gmail authenticated (session valid)")
             print(f"  User ID: {config.user_id}")
             print(f"  Connection ID: {config.connection_id}")
+            prewarm_clients()
             return True
         else:
             print("⚠ Stored session is no longer valid")
             print("  Clearing invalid session and re-authenticating...")
             config.clear_auth()
+            invalidate_connection_cache()
     
     # No valid session found - authenticate automatically
     print("⚠ Gmail not authenticated")
@@ -366,7 +855,9 @@ def startup_check():
         print("✓ Gmail authentication successful!")
         print(f"  User ID: {config.user_id}")
         print(f"  Connection ID: {config.connection_id}")
-        print("  Session stored locally\n")
+        print("  Session stored locally")
+        prewarm_clients()
+        print()
         return True
     except Exception as e:
         print(f"✗ Authentication failed: {e}")
@@ -394,11 +885,23 @@ def main():
     print(f"\n🚀 Starting server at http://{config.flask_host}:{config.flask_port}")
     print("   Press Ctrl+C to stop\n")
     
-    # Start Flask server
-    app.run(
+    if config.flask_debug:
+        # Werkzeug's dev server provides the reloader and interactive debugger
+        app.run(
+            host=config.flask_host,
+            port=config.flask_port,
+            debug=True
+        )
+        return
+    
+    # Production WSGI server; worker threads let slow Composio/OpenAI calls overlap
+    from waitress import serve
+    serve(
+        app,
         host=config.flask_host,
         port=config.flask_port,
-        debug=config.flask_debug
+        threads=config.server_threads,
+        connection_limit=config.server_connection_limit,
     )
 
 